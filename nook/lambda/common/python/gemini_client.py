@@ -37,6 +37,10 @@ def _log_retry_attempt(retry_state):
     )
 
 
+class MaxTokensError(Exception):
+    """Raised when a response was cut off by the max_output_tokens limit."""
+
+
 @dataclass
 class GeminiClientConfig:
     """Configuration for the Gemini client."""
@@ -101,6 +105,7 @@ class GeminiClient:
         top_k: int | None = None,
         max_output_tokens: int | None = None,
         response_mime_type: str | None = None,
+        raise_on_max_tokens: bool = False,
     ) -> str:
         """
         Generate content using the Gemini API.
@@ -129,11 +134,19 @@ class GeminiClient:
         response_mime_type : str | None
             The response_mime_type to use.
             If not provided, the response_mime_type from the config will be used.
+        raise_on_max_tokens : bool
+            Whether to raise instead of returning a response
+            that was cut off by the max_output_tokens limit.
 
         Returns
         -------
         str
             The generated content.
+
+        Raises
+        ------
+        MaxTokensError
+            If raise_on_max_tokens is set and the response was cut off.
         """
         if isinstance(contents, str):
             contents = [contents]
@@ -156,7 +169,15 @@ class GeminiClient:
             config=types.GenerateContentConfig(**config_params),
         )
 
-        return response.candidates[0].content.parts[0].text
+        candidate = response.candidates[0]
+        if candidate.finish_reason == types.FinishReason.MAX_TOKENS:
+            logger.warning("Response was cut off by the max_output_tokens limit.")
+            if raise_on_max_tokens:
+                raise MaxTokensError(
+                    "Response was cut off by the max_output_tokens limit."
+                )
+
+        return candidate.content.parts[0].text
 
     def create_chat(
         self,
@@ -1,18 +1,31 @@
+import concurrent.futures
+import hashlib
 import inspect
+import io
 import os
+import threading
+import time
 import traceback
 from dataclasses import dataclass, field
-from datetime import date
-from typing import Any, Literal
-import time
-import json
+from datetime import date, timedelta
+from typing import Any, Literal, NamedTuple
 import base64
 
 import boto3
-import praw
+import httpx
+import orjson
 import tomllib
+from boto3.exceptions import S3UploadFailedError
 from botocore.exceptions import ClientError
-from gemini_client import create_client
+from gemini_client import MaxTokensError, create_client
+from google.genai.errors import APIError
+from tenacity import (
+    RetryCallState,
+    retry,
+    retry_if_exception,
+    stop_after_attempt,
+    wait_exponential,
+)
 
 _MARKDOWN_FORMAT = """
 # {title}
@@ -26,11 +39,112 @@ _MARKDOWN_FORMAT = """
 {summary}
 """
 
+# The prompts are cleaned up once here and only formatted for each post
+_SYSTEM_INSTRUCTION = inspect.cleandoc(
+    """
+    ユーザーから、Redditのあるポストのタイトルと投稿文（ある場合のみ）、そして当ポストに対する主なコメントが与えられます。
+    よく読んで、以下の2つの質問について、順を追って詳細に、分かりやすく答えてください。
+
+    1. このポストの内容を説明してください。
+    2. このポストに対するコメントのうち、特に興味深いものを教えてください。
+
+    この質問の回答以外の出力は不要です。
+    """
+)
+
+_BATCH_SYSTEM_INSTRUCTION = inspect.cleandoc(
+    """
+    ユーザーから、Redditの複数のポストについて、それぞれのID、タイトルと投稿文（ある場合のみ）、そして当ポストに対する主なコメントが与えられます。
+    よく読んで、ポストごとに、以下の2つの質問について、順を追って詳細に、分かりやすく答えてください。
+
+    1. このポストの内容を説明してください。
+    2. このポストに対するコメントのうち、特に興味深いものを教えてください。
+
+    回答は、ポストのIDをキー、そのポストについての回答を値とするJSONオブジェクトで返してください。
+    例: {"abc123": "1. ...\\n2. ...", "def456": "1. ...\\n2. ..."}
+    回答はMarkdown形式の文字列とし、このJSONオブジェクト以外の出力は不要です。
+    """
+)
+
+_CONTENTS_FORMAT = inspect.cleandoc(
+    """
+    タイトル
+    '''
+    {title}
+    '''
+
+    {selftext}
+
+    コメント
+    '''
+    {comments}
+    '''
+    """
+)
+
+_SELFTEXT_FORMAT = inspect.cleandoc(
+    """
+    投稿文
+    '''
+    {selftext}
+    '''
+    """
+)
+
+_BATCH_CONTENTS_FORMAT = inspect.cleandoc(
+    """
+    ID: {id}
+
+    {contents}
+    """
+)
+
+_LOW_SIGNAL_SUMMARY = "（投稿文とコメントが少ないため、要約は省略しました）"
+
+_SKIPPED_POST_TYPES = frozenset({"gallery", "poll", "crosspost"})
+
+# Reused across warm invocations of the Lambda container
+_S3 = None
+_REDDIT = None
+
+
+def _s3() -> Any:
+    global _S3
+    if _S3 is None:
+        _S3 = boto3.client("s3")
+    return _S3
+
+
+def _reddit() -> "RedditClient":
+    global _REDDIT
+    if _REDDIT is None:
+        _REDDIT = RedditClient(
+            client_id=os.environ["REDDIT_CLIENT_ID"],
+            client_secret=os.environ["REDDIT_CLIENT_SECRET"],
+            user_agent=os.environ["REDDIT_USER_AGENT"],
+        )
+    return _REDDIT
+
 
 class Config:
     reddit_top_posts_limit = 10
     reddit_top_comments_limit = 3
+    # The rate limiter spaces out the Reddit requests of all the workers, while
+    # their Gemini calls overlap freely
+    reddit_requests_per_minute = 60
+    reddit_max_retry_wait = 120
+    max_workers = 5
     summary_index_s3_key_format = "reddit_explorer/{date}.md"
+    summary_cache_s3_key = "reddit_explorer/_cache/index.json"
+    summary_cache_ttl_days = 7
+    # gemini-2.0-flash's maximum, shared by all the summaries of a batch
+    gemini_max_output_tokens = 8192
+    # Output tokens reserved for a single detailed summary
+    summary_output_tokens = 2048
+    # Number of posts summarized in a single Gemini request
+    summary_batch_size = gemini_max_output_tokens // summary_output_tokens
+    # Posts with less selftext and comments than this are not summarized
+    min_summarized_text_length = 200
 
     @classmethod
     def load_subreddits(cls) -> list[str]:
@@ -49,7 +163,12 @@ class Config:
         return subreddits
 
 
-@dataclass
+class RedditComment(NamedTuple):
+    text: str
+    upvotes: int
+
+
+@dataclass(slots=True)
 class RedditPost:
     type: Literal["image", "gallery", "video", "poll", "crosspost", "text", "link"]
     id: str
@@ -58,47 +177,314 @@ class RedditPost:
     upvotes: int
     text: str
     permalink: str = ""
-    comments: list[dict[str, str | int]] = field(init=False)
+    comments: list[RedditComment] = field(init=False)
     summary: str = field(init=False)
     thumbnail: str = "self"
 
 
+def _is_retryable_reddit_error(exception: BaseException) -> bool:
+    if isinstance(exception, httpx.TransportError):
+        return True
+    if isinstance(exception, httpx.HTTPStatusError):
+        status_code = exception.response.status_code
+        return status_code == 429 or status_code >= 500
+    return False
+
+
+def _wait_for_reddit_retry(retry_state: RetryCallState) -> float:
+    """
+    Wait as long as Reddit asks to, or back off exponentially otherwise.
+
+    Parameters
+    ----------
+    retry_state : tenacity.RetryCallState
+        The state of the retry.
+
+    Returns
+    -------
+    float
+        The number of seconds to wait before the next attempt.
+    """
+    exception = retry_state.outcome.exception()
+    if isinstance(exception, httpx.HTTPStatusError):
+        headers = exception.response.headers
+        # X-Ratelimit-Reset is sent with every response,
+        # so it is only meaningful once the rate limit is actually hit
+        names = ["Retry-After"]
+        if exception.response.status_code == 429:
+            names.append("X-Ratelimit-Reset")
+        for name in names:
+            try:
+                return min(float(headers[name]), Config.reddit_max_retry_wait)
+            except (KeyError, ValueError):
+                continue
+    return wait_exponential(multiplier=2, min=2, max=Config.reddit_max_retry_wait)(
+        retry_state
+    )
+
+
+def _log_reddit_retry(retry_state: RetryCallState) -> None:
+    print(
+        f"Reddit request failed (attempt {retry_state.attempt_number}). "
+        f"Waiting {retry_state.next_action.sleep:.2f}s before retry. "
+        f"Error: {retry_state.outcome.exception()}"
+    )
+
+
+_reddit_retry = retry(
+    stop=stop_after_attempt(5),
+    wait=_wait_for_reddit_retry,
+    retry=retry_if_exception(_is_retryable_reddit_error),
+    before_sleep=_log_reddit_retry,
+    reraise=True,
+)
+
+
+class RedditClient:
+    """
+    Minimal client for Reddit's OAuth JSON API.
+
+    It only implements the listings needed here, and spaces out the requests
+    so that at most `requests_per_minute` requests are sent.
+    """
+
+    _token_url = "https://www.reddit.com/api/v1/access_token"
+    _api_url = "https://oauth.reddit.com"
+
+    def __init__(
+        self,
+        client_id: str,
+        client_secret: str,
+        user_agent: str,
+        requests_per_minute: int = Config.reddit_requests_per_minute,
+    ):
+        self._auth = (client_id, client_secret)
+        self._http = httpx.Client(headers={"User-Agent": user_agent}, timeout=30)
+        self._token = None
+        self._token_expires_at = 0.0
+        self._token_lock = threading.Lock()
+        self._request_interval = 60 / requests_per_minute
+        self._next_request_at = 0.0
+        self._rate_limit_lock = threading.Lock()
+
+    def hot(self, subreddit: str, limit: int) -> list[dict[str, Any]]:
+        """
+        Get the hot posts of a subreddit.
+
+        Parameters
+        ----------
+        subreddit : str
+            The name of the subreddit.
+        limit : int
+            The maximum number of posts.
+
+        Returns
+        -------
+        list[dict[str, Any]]
+            The posts, as returned by the API.
+        """
+        listing = self._get(f"/r/{subreddit}/hot", params={"limit": limit})
+        return [child["data"] for child in listing["data"]["children"]]
+
+    def top_level_comments(self, post_id: str, limit: int) -> list[dict[str, Any]]:
+        """
+        Get the top-level comments of a post, in Reddit's default order.
+
+        Parameters
+        ----------
+        post_id : str
+            The ID of the post.
+        limit : int
+            The maximum number of comments.
+
+        Returns
+        -------
+        list[dict[str, Any]]
+            The comments, as returned by the API.
+        """
+        _, comments = self._get(
+            f"/comments/{post_id}", params={"limit": limit, "depth": 1}
+        )
+        return [
+            child["data"]
+            for child in comments["data"]["children"]
+            if child["kind"] == "t1"
+        ][:limit]
+
+    @_reddit_retry
+    def _get(self, path: str, params: dict[str, Any]) -> Any:
+        self._wait_for_rate_limit()
+        response = self._http.get(
+            f"{self._api_url}{path}",
+            params={**params, "raw_json": 1},
+            headers={"Authorization": f"bearer {self._access_token()}"},
+        )
+        response.raise_for_status()
+        return response.json()
+
+    def _access_token(self) -> str:
+        with self._token_lock:
+            if self._token is None or time.monotonic() >= self._token_expires_at:
+                token = self._request_token()
+                self._token = token["access_token"]
+                # refresh a minute before the token actually expires
+                self._token_expires_at = time.monotonic() + token["expires_in"] - 60
+            return self._token
+
+    @_reddit_retry
+    def _request_token(self) -> dict[str, Any]:
+        response = self._http.post(
+            self._token_url,
+            auth=self._auth,
+            data={"grant_type": "client_credentials"},
+        )
+        response.raise_for_status()
+        return response.json()
+
+    def _wait_for_rate_limit(self) -> None:
+        with self._rate_limit_lock:
+            now = time.monotonic()
+            wait = self._next_request_at - now
+            self._next_request_at = max(now, self._next_request_at)
+            self._next_request_at += self._request_interval
+        if wait > 0:
+            time.sleep(wait)
+
+
 class RedditExplorer:
     def __init__(self):
-        self._reddit = praw.Reddit(
-            client_id=os.environ.get("REDDIT_CLIENT_ID"),
-            client_secret=os.environ.get("REDDIT_CLIENT_SECRET"),
-            user_agent=os.environ.get("REDDIT_USER_AGENT"),
-        )
+        self._reddit = _reddit()
         self._client = create_client()
-        self._s3 = boto3.client("s3")
+        self._s3 = _s3()
         self._bucket_name = os.environ["BUCKET_NAME"]
         self._subreddits = Config.load_subreddits()
+        self._summary_cache = self._load_summary_cache()
 
     def __call__(self) -> None:
-        markdowns = []
-        for subreddit in self._subreddits:
-            posts = self._retrieve_hot_posts(subreddit)
-            for post in posts:
+        try:
+            with concurrent.futures.ThreadPoolExecutor(
+                max_workers=Config.max_workers
+            ) as executor:
+                markdowns = [
+                    markdown
+                    for subreddit_markdowns in executor.map(
+                        self._process_subreddit, self._subreddits
+                    )
+                    for markdown in subreddit_markdowns
+                ]
+
+            self._store_summaries(markdowns)
+        finally:
+            # Keep the summaries made so far even if the run fails midway
+            self._save_summary_cache()
+
+    def _process_subreddit(self, subreddit: str) -> list[str]:
+        # Each batch is summarized as soon as its comments are fetched, so that
+        # Reddit requests of other subreddits overlap with the Gemini calls
+        posts = self._retrieve_hot_posts(subreddit)
+        for i in range(0, len(posts), Config.summary_batch_size):
+            batch = posts[i : i + Config.summary_batch_size]
+            for post in batch:
                 post.comments = self._retrieve_top_comments_of_post(post.id)
-                post.summary = self._summarize_reddit_post(post)
-                markdowns.append(self._stylize_post(post))
-                time.sleep(5)
-
-        self._store_summaries(markdowns)
+            self._process_batch(batch)
+        return [self._stylize_post(post) for post in posts]
+
+    def _process_batch(self, posts: list[RedditPost]) -> None:
+        # Summarize the posts that are not cached yet in a single request first.
+        # The ones missing from its answer are then summarized one by one.
+        uncached_posts = [
+            post
+            for post in posts
+            if not self._is_low_signal(post)
+            and self._summary_cache_key(post) not in self._summary_cache
+        ]
+        if len(uncached_posts) > 1:
+            summaries = self._summarize_reddit_posts(uncached_posts)
+            for post in uncached_posts:
+                if post.id in summaries:
+                    self._summary_cache[self._summary_cache_key(post)] = {
+                        "summary": summaries[post.id],
+                        "created_at": date.today().isoformat(),
+                    }
+            if missing := len(uncached_posts) - len(summaries):
+                print(f"Summarizing {missing} posts missing from the batch one by one.")
+
+        for post in posts:
+            post.summary = self._summarize_reddit_post(post)
 
     def _store_summaries(self, summaries: list[str]) -> None:
         date_str = date.today().strftime("%Y-%m-%d")
         key = Config.summary_index_s3_key_format.format(date=date_str)
-        content = "\n---\n".join(summaries)
+        # Write the summaries one by one instead of joining them into one string;
+        # upload_fileobj switches to a concurrent multipart upload for large files
+        content = io.BytesIO()
+        for i, summary in enumerate(summaries):
+            if i > 0:
+                content.write(b"\n---\n")
+            content.write(summary.encode("utf-8"))
+        content.seek(0)
+        try:
+            self._s3.upload_fileobj(content, self._bucket_name, key)
+        except (ClientError, S3UploadFailedError) as e:
+            print(f"Error putting object {key} into bucket {self._bucket_name}.")
+            print(e)
+
+    def _load_summary_cache(self) -> dict[str, dict[str, str]]:
+        """
+        Load the cached summaries, dropping the ones older than the TTL.
+
+        Returns
+        -------
+        dict[str, dict[str, str]]
+            The cached summaries keyed by the hash of their post,
+            or {} if the cache could not be loaded.
+        """
+        try:
+            response = self._s3.get_object(
+                Bucket=self._bucket_name,
+                Key=Config.summary_cache_s3_key,
+            )
+            cache = orjson.loads(response["Body"].read())
+        except (ClientError, orjson.JSONDecodeError) as e:
+            print(
+                f"Error getting object {Config.summary_cache_s3_key} "
+                f"from bucket {self._bucket_name}. "
+            )
+            print(e)
+            return {}
+
+        if not isinstance(cache, dict):
+            print(f"Ignoring malformed summary cache {Config.summary_cache_s3_key}.")
+            return {}
+
+        oldest = date.today() - timedelta(days=Config.summary_cache_ttl_days)
+        return {
+            key: entry
+            for key, entry in cache.items()
+            if self._is_valid_cache_entry(entry, oldest)
+        }
+
+    def _is_valid_cache_entry(self, entry: Any, oldest: date) -> bool:
+        try:
+            return (
+                isinstance(entry["summary"], str)
+                and date.fromisoformat(entry["created_at"]) > oldest
+            )
+        except (KeyError, TypeError, ValueError):
+            return False
+
+    def _save_summary_cache(self) -> None:
         try:
             self._s3.put_object(
                 Bucket=self._bucket_name,
-                Key=key,
-                Body=content,
+                Key=Config.summary_cache_s3_key,
+                Body=orjson.dumps(self._summary_cache),
             )
         except ClientError as e:
-            print(f"Error putting object {key} into bucket {self._bucket_name}.")
+            print(
+                f"Error putting object {Config.summary_cache_s3_key} "
+                f"into bucket {self._bucket_name}."
+            )
             print(e)
 
     def _retrieve_hot_posts(
@@ -108,93 +494,173 @@ class RedditExplorer:
             limit = Config.reddit_top_posts_limit
 
         posts = []
-        for post in self._reddit.subreddit(subreddit).hot(limit=limit):
+        for post in self._reddit.hot(subreddit, limit=limit):
             post_type = self.__judge_post_type(post)
 
-            url = self._get_video_url(post) if post_type == "video" else post.url
-
             # filter out undesired posts
-            if post.author.name == "AutoModerator":
-                continue
-            if "megathread" in post.title.lower():
-                continue
-            if post.upvote_ratio < 0.7:
-                continue
-            if ["gallery", "poll", "crosspost"].__contains__(post_type):
+            if self._should_skip(post, post_type):
                 continue
+
+            url = self._get_video_url(post) if post_type == "video" else post["url"]
             posts.append(
                 RedditPost(
                     type=post_type,
-                    id=post.id,
-                    title=post.title,
+                    id=post["id"],
+                    title=post["title"],
                     url=url,
-                    upvotes=post.ups,
-                    text=post.selftext,
-                    thumbnail=post.thumbnail,
+                    upvotes=post["ups"],
+                    text=post["selftext"],
+                    thumbnail=post["thumbnail"],
                 )
             )
-            posts[-1].permalink = f"https://www.reddit.com{post.permalink}"
+            posts[-1].permalink = f"https://www.reddit.com{post['permalink']}"
         return posts
 
+    def _should_skip(self, post: dict[str, Any], post_type: str) -> bool:
+        return (
+            post["author"] == "AutoModerator"
+            or "megathread" in post["title"].lower()
+            or post["upvote_ratio"] < 0.7
+            or post_type in _SKIPPED_POST_TYPES
+        )
+
     def _retrieve_top_comments_of_post(
         self,
         post_id: str,
         limit: int = None,
-    ) -> list[dict[str, str | int]]:
+    ) -> list[RedditComment]:
         if limit is None:
             limit = Config.reddit_top_comments_limit
 
-        submission = self._reddit.submission(id=post_id)
-        submission.comments.replace_more(limit=0)
         return [
-            {
-                "text": comment.body,
-                "upvotes": comment.ups,
-            }
-            for comment in submission.comments.list()[:limit]
+            RedditComment(text=comment["body"], upvotes=comment["ups"])
+            for comment in self._reddit.top_level_comments(post_id, limit=limit)
         ]
 
     def _summarize_reddit_post(self, post: RedditPost) -> str:
-        comments_text = "\n".join(
-            [
-                f"{comment['upvotes']} upvotes: {comment['text']}"
-                for comment in post.comments
-            ]
-        )
+        # Nothing worth asking Gemini about
+        if self._is_low_signal(post):
+            return _LOW_SIGNAL_SUMMARY
+
+        cache_key = self._summary_cache_key(post)
+        if (cached := self._summary_cache.get(cache_key)) is not None:
+            return cached["summary"]
 
-        return self._client.generate_content(
-            contents=self._contents,
-            system_instruction=self._system_instruction_format(
+        summary = self._client.generate_content(
+            contents=self._contents_format(
                 title=post.title,
-                comments=comments_text,
+                comments=self._comments_text(post),
                 selftext=post.text,
             ),
+            system_instruction=_SYSTEM_INSTRUCTION,
+        )
+        self._summary_cache[cache_key] = {
+            "summary": summary,
+            "created_at": date.today().isoformat(),
+        }
+        return summary
+
+    def _summarize_reddit_posts(self, posts: list[RedditPost]) -> dict[str, str]:
+        """
+        Summarize several posts in a single request.
+
+        Parameters
+        ----------
+        posts : list[RedditPost]
+            The posts to summarize.
+
+        Returns
+        -------
+        dict[str, str]
+            The summaries keyed by post ID.
+            Posts that Gemini did not answer for properly are left out.
+        """
+        contents = "\n\n".join(
+            _BATCH_CONTENTS_FORMAT.format(
+                id=post.id,
+                contents=self._contents_format(
+                    title=post.title,
+                    comments=self._comments_text(post),
+                    selftext=post.text,
+                ),
+            )
+            for post in posts
+        )
+        try:
+            response = self._client.generate_content(
+                contents=contents,
+                system_instruction=_BATCH_SYSTEM_INSTRUCTION,
+                max_output_tokens=Config.gemini_max_output_tokens,
+                response_mime_type="application/json",
+                raise_on_max_tokens=True,
+            )
+        except MaxTokensError:
+            print(f"The summaries of {len(posts)} posts did not fit in one response.")
+            return {}
+        except (APIError, httpx.HTTPError) as e:
+            # A failed batch only costs its posts a single call each
+            print(f"Error summarizing a batch of {len(posts)} posts: {e}")
+            return {}
+
+        try:
+            summaries = orjson.loads(response)
+        except orjson.JSONDecodeError as e:
+            print(f"Error decoding the summaries of {len(posts)} posts: {e}")
+            return {}
+        if not isinstance(summaries, dict):
+            return {}
+        return {
+            post.id: summaries[post.id]
+            for post in posts
+            if isinstance(summaries.get(post.id), str)
+        }
+
+    def _is_low_signal(self, post: RedditPost) -> bool:
+        text_length = len(post.text) + sum(
+            len(comment.text) for comment in post.comments
+        )
+        return text_length < Config.min_summarized_text_length
+
+    def _comments_text(self, post: RedditPost) -> str:
+        return "\n".join(
+            [
+                f"{comment.upvotes} upvotes: {comment.text}"
+                for comment in post.comments
+            ]
         )
 
+    def _summary_cache_key(self, post: RedditPost) -> str:
+        # Upvotes are left out on purpose: they change on every run and would
+        # otherwise make the same post miss the cache.
+        comments = "\n".join(comment.text for comment in post.comments)
+        return hashlib.sha1(
+            "\0".join([post.id, post.title, post.text, comments]).encode("utf-8")
+        ).hexdigest()
+
     def __judge_post_type(
-        self, post: praw.models.Submission
+        self, post: dict[str, Any]
     ) -> Literal["image", "gallery", "video", "poll", "crosspost", "text", "link"]:
-        if getattr(post, "post_hint", "") == "image":
+        if post.get("post_hint", "") == "image":
             return "image"
-        elif getattr(post, "is_gallery", False):
+        elif post.get("is_gallery", False):
             return "gallery"
-        elif getattr(post, "is_video", False):
+        elif post.get("is_video", False):
             return "video"
-        elif hasattr(post, "poll_data"):
+        elif "poll_data" in post:
             return "poll"
-        elif hasattr(post, "crosspost_parent"):
+        elif "crosspost_parent" in post:
             return "crosspost"
-        elif post.is_self:
+        elif post["is_self"]:
             return "text"
         return "link"
 
-    def _get_video_url(self, post: praw.models.Submission) -> str | None:
-        if hasattr(post, "media"):
-            return post.media.get("reddit_video", {}).get("fallback_url", None)
-        elif hasattr(post, "secure_media"):
-            return post.secure_media.get("reddit_video", {}).get("fallback_url", None)
-        else:
+    def _get_video_url(self, post: dict[str, Any]) -> str | None:
+        # Both keys are always present, but are null when the post has no media
+        media = post.get("media") or post.get("secure_media")
+        if not media:
             return None
+        reddit_video = media.get("reddit_video") or {}
+        return reddit_video.get("fallback_url")
 
     def _stylize_post(self, post: RedditPost) -> str:
         return _MARKDOWN_FORMAT.format(
@@ -211,47 +677,11 @@ class RedditExplorer:
             summary=post.summary,
         )
 
-    def _system_instruction_format(
-        self, title: str, comments: str, selftext: str
-    ) -> str:
-        self_text = inspect.cleandoc(
-            f"""
-            投稿文
-            '''
-            {selftext}
-            '''
-            """
-        )
-        return inspect.cleandoc(
-            f"""
-            以下のテキストは、Redditのあるポストのタイトルと{"投稿文、そして" if selftext else ""}当ポストに対する主なコメントです。
-            よく読んで、ユーザーの質問に答えてください。
-
-            タイトル
-            '''
-            {title}
-            '''
-
-            {self_text if selftext else ""}
-
-            コメント
-            '''
-            {comments}
-            '''
-            """
-        )
-
-    @property
-    def _contents(self) -> str:
-        return inspect.cleandoc(
-            """
-            以下の2つの質問について、順を追って詳細に、分かりやすく答えてください。
-
-            1. このポストの内容を説明してください。
-            2. このポストに対するコメントのうち、特に興味深いものを教えてください。
-
-            この質問の回答以外の出力は不要です。
-            """
+    def _contents_format(self, title: str, comments: str, selftext: str) -> str:
+        return _CONTENTS_FORMAT.format(
+            title=title,
+            selftext=_SELFTEXT_FORMAT.format(selftext=selftext) if selftext else "",
+            comments=comments,
         )
 
 
@@ -267,25 +697,28 @@ def lambda_handler(event: dict[str, Any], context: Any) -> dict[str, Any]:
         # Check for Function URL trigger (or API Gateway)
         elif "requestContext" in event and event.get("requestContext", {}).get("http", {}).get("method") == "POST":
             print("Invocation source: Function URL (POST)")
-            body_str = event.get("body", "{}")
+            body = event.get("body", "{}")
             if event.get("isBase64Encoded", False):
                 print("Decoding Base64 body")
                 try:
-                    body_str = base64.b64decode(body_str).decode('utf-8')
-                except (base64.binascii.Error, UnicodeDecodeError) as e:
+                    # orjson parses bytes as they are, so no need to decode into str
+                    body = base64.b64decode(body)
+                except base64.binascii.Error as e:
                     print(f"Failed to decode Base64 body: {e}")
-                    body_str = "{}"
-            print(f"Parsed body string: {body_str[:200]}...")
+                    body = b"{}"
+            elif isinstance(body, str):
+                body = body.encode()
+            print(f"Parsed body: {body[:200].decode(errors='replace')}...")
             try:
-                body_json = json.loads(body_str)
+                body_json = orjson.loads(body)
                 if body_json.get("source") == "aws.events":
                     print("Found 'source: aws.events' in request body.")
                     is_trigger_event = True
                 else:
                     print("Request body did not contain 'source: aws.events'.")
-            except json.JSONDecodeError as e:
+            except orjson.JSONDecodeError as e:
                 print(f"Failed to decode JSON body: {e}")
-                print(f"Body content was: {body_str}")
+                print(f"Body content was: {body.decode(errors='replace')}")
 
         if is_trigger_event:
             print("Triggering RedditExplorer job...")
@@ -296,7 +729,9 @@ def lambda_handler(event: dict[str, Any], context: Any) -> dict[str, Any]:
             return {
                 "statusCode": 200,
                 "headers": {"Content-Type": "application/json"},
-                "body": json.dumps({"message": "RedditExplorer triggered successfully"})
+                "body": orjson.dumps(
+                    {"message": "RedditExplorer triggered successfully"}
+                ).decode()
             }
         else:
             print("Invocation source not recognized or payload mismatch. No action taken.")
@@ -304,7 +739,12 @@ def lambda_handler(event: dict[str, Any], context: Any) -> dict[str, Any]:
                 return {
                     "statusCode": 400,
                     "headers": {"Content-Type": "application/json"},
-                    "body": json.dumps({"message": "Invalid request: Expected 'source: aws.events' in POST body"})
+                    "body": orjson.dumps(
+                        {
+                            "message": "Invalid request: Expected 'source: aws.events' "
+                            "in POST body"
+                        }
+                    ).decode()
                 }
             else:
                 return {"statusCode": 400}
@@ -316,7 +756,9 @@ def lambda_handler(event: dict[str, Any], context: Any) -> dict[str, Any]:
             return {
                 "statusCode": 500,
                 "headers": {"Content-Type": "application/json"},
-                "body": json.dumps({"message": f"Internal server error: {e}"})
+                "body": orjson.dumps(
+                    {"message": f"Internal server error: {e}"}
+                ).decode()
             }
         else:
             return {"statusCode": 500}
@@ -5,11 +5,11 @@ import traceback
 from dataclasses import dataclass, field
 from datetime import date, datetime, timedelta
 from typing import Any
-import json
 import base64
 
 import boto3
 import feedparser
+import orjson
 import requests
 import tomllib
 from botocore.exceptions import ClientError
@@ -192,27 +192,30 @@ def lambda_handler(event: dict[str, Any], context: Any) -> dict[str, Any]:
             print("Invocation source: EventBridge")
         elif "requestContext" in event and event.get("requestContext", {}).get("http", {}).get("method") == "POST":
             print("Invocation source: Function URL (POST)")
-            body_str = event.get("body", "{}")
+            body = event.get("body", "{}")
             if event.get("isBase64Encoded", False):
                 print("Decoding Base64 body")
                 try:
-                    body_str = base64.b64decode(body_str).decode('utf-8')
-                except (base64.binascii.Error, UnicodeDecodeError) as e:
+                    # orjson parses bytes as they are, so no need to decode into str
+                    body = base64.b64decode(body)
+                except base64.binascii.Error as e:
                     print(f"Failed to decode Base64 body: {e}")
-                    body_str = "{}"
+                    body = b"{}"
+            elif isinstance(body, str):
+                body = body.encode()
 
-            print(f"Parsed body string: {body_str[:200]}...")
+            print(f"Parsed body: {body[:200].decode(errors='replace')}...")
 
             try:
-                body_json = json.loads(body_str)
+                body_json = orjson.loads(body)
                 if body_json.get("source") == "aws.events":
                     print("Found 'source: aws.events' in request body.")
                     is_trigger_event = True
                 else:
                     print("Request body did not contain 'source: aws.events'.")
-            except json.JSONDecodeError as e:
+            except orjson.JSONDecodeError as e:
                 print(f"Failed to decode JSON body: {e}")
-                print(f"Body content was: {body_str}")
+                print(f"Body content was: {body.decode(errors='replace')}")
 
         if is_trigger_event:
             print("Triggering TechFeed job...")
@@ -222,7 +225,9 @@ def lambda_handler(event: dict[str, Any], context: Any) -> dict[str, Any]:
             return {
                 "statusCode": 200,
                 "headers": {"Content-Type": "application/json"},
-                "body": json.dumps({"message": "TechFeed triggered successfully"})
+                "body": orjson.dumps(
+                    {"message": "TechFeed triggered successfully"}
+                ).decode()
             }
         else:
             print("Invocation source not recognized or payload mismatch. No action taken.")
@@ -230,7 +235,12 @@ def lambda_handler(event: dict[str, Any], context: Any) -> dict[str, Any]:
                 return {
                     "statusCode": 400,
                     "headers": {"Content-Type": "application/json"},
-                    "body": json.dumps({"message": "Invalid request: Expected 'source: aws.events' in POST body"})
+                    "body": orjson.dumps(
+                        {
+                            "message": "Invalid request: Expected 'source: aws.events' "
+                            "in POST body"
+                        }
+                    ).decode()
                 }
             else:
                 print("Returning 400 for unrecognized non-HTTP invocation.")
@@ -243,7 +253,9 @@ def lambda_handler(event: dict[str, Any], context: Any) -> dict[str, Any]:
              return {
                 "statusCode": 500,
                 "headers": {"Content-Type": "application/json"},
-                "body": json.dumps({"message": f"Internal server error: {e}"})
+                "body": orjson.dumps(
+                    {"message": f"Internal server error: {e}"}
+                ).decode()
             }
         else:
             return {"statusCode": 500}
@@ -1,25 +1,67 @@
+import asyncio
 import datetime
+import hashlib
 import os
 import re
-import json
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
 
 import boto3
+import httpx
+from botocore.config import Config
+from botocore.exceptions import ClientError
+import orjson
 import requests
-from bs4 import BeautifulSoup
 from fastapi import FastAPI, Request, HTTPException
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.responses import HTMLResponse, ORJSONResponse, Response
 from fastapi.templating import Jinja2Templates
 from gemini_client import create_client
+from jinja2 import Environment, FileSystemLoader
 from mangum import Mangum
-
-app = FastAPI()
-templates = Jinja2Templates(directory="templates")
+from selectolax.lexbor import LexborHTMLParser
+
+app = FastAPI(default_response_class=ORJSONResponse)
+# テンプレートはデプロイ後に変わらないので、描画のたびの更新確認は行わない
+templates = Jinja2Templates(
+    env=Environment(
+        loader=FileSystemLoader("templates"),
+        auto_reload=False,
+        autoescape=True,
+    )
+)
+# テンプレートが変わったデプロイの後に古いページが304で返らないよう、ETagに含める
+with open("templates/index.html", "rb") as f:
+    _INDEX_TEMPLATE_HASH = hashlib.md5(f.read()).hexdigest()
 
 # S3バケット名は環境変数から取得
 BUCKET_NAME = os.environ.get("BUCKET_NAME")
-s3_client = boto3.client("s3")
-lambda_client = boto3.client("lambda")
+# クライアントはモジュールレベルで一度だけ作成し、ウォームスタート時に再利用する
+# スロットリング時はadaptiveモードで素早くリトライし、TCPコネクションも使い回す
+s3_client = boto3.client(
+    "s3",
+    config=Config(
+        retries={"mode": "adaptive", "max_attempts": 3},
+        tcp_keepalive=True,
+        max_pool_connections=64,
+    ),
+)
+lambda_client = boto3.client(
+    "lambda",
+    config=Config(
+        retries={"mode": "adaptive", "max_attempts": 3},
+        tcp_keepalive=True,
+        max_pool_connections=32,
+    ),
+)
 gemini_model = "gemini-2.0-flash"
+# チャットで参照するリンクの取得用。
+# コネクションを使い回すためにモジュールレベルで作成する
+http_client = httpx.AsyncClient(
+    timeout=10,
+    follow_redirects=True,
+    limits=httpx.Limits(max_connections=32),
+)
 
 # 対象のアプリ名リスト
 app_names = [
@@ -48,6 +90,11 @@ WEATHER_ICONS = {
     "400": "🌨️",  # 雪
 }
 
+# 天気データのキャッシュ（取得時刻, データ）。
+# 予報の更新は1時間に数回程度なので短時間は使い回す
+WEATHER_CACHE_TTL = 600
+_weather_cache: tuple[float, dict] | None = None
+
 
 def get_weather_data():
     """
@@ -58,6 +105,10 @@ def get_weather_data():
     dict
         天気データ（気温と天気コード）
     """
+    global _weather_cache
+    if _weather_cache and time.monotonic() - _weather_cache[0] < WEATHER_CACHE_TTL:
+        return _weather_cache[1]
+
     try:
         response = requests.get(
             "https://www.jma.go.jp/bosai/forecast/data/forecast/130000.json", timeout=5
@@ -89,11 +140,13 @@ def get_weather_data():
             weather_code = tokyo_weather["weatherCodes"][0]
             weather_icon = WEATHER_ICONS.get(weather_code, "")
 
-            return {
+            weather_data = {
                 "temp": temps[0],
                 "weather_code": weather_code,
                 "weather_icon": weather_icon,
             }
+            _weather_cache = (time.monotonic(), weather_data)
+            return weather_data
     except Exception as e:
         print(f"Error fetching weather data: {e}")
 
@@ -105,38 +158,105 @@ def get_weather_data():
     }
 
 
+# Markdown形式のリンク [text](url)
+_MARKDOWN_LINK_PATTERN = re.compile(r"\[([^\]]+)\]\(([^)]+)\)")
+# Markdownのリンク以外の通常のURL
+_URL_PATTERN = re.compile(r"(?<![\(\[])(https?://[^\s\)]+)")
+# 画像・動画のリンクは除外する（キャプチャされるテキストには角括弧を含まない）
+_SKIPPED_LINK_TEXTS = ("Image", "Video")
+
+
 def extract_links(text: str) -> list[str]:
     """Markdownテキストからリンクを抽出する"""
     # Markdown形式のリンク [text](url) を抽出
-    markdown_links = re.findall(r"\[([^\]]+)\]\(([^)]+)\)", text)
     # もし[text]の部分が[Image]または[Video]の場合は、その部分を除外
     markdown_links = [
-        (text, url)
-        for text, url in markdown_links
-        if not text.startswith("[Image]") and not text.startswith("[Video]")
+        url
+        for link_text, url in _MARKDOWN_LINK_PATTERN.findall(text)
+        if not link_text.startswith(_SKIPPED_LINK_TEXTS)
     ]
     # 通常のURLも抽出
-    urls = re.findall(r"(?<![\(\[])(https?://[^\s\)]+)", text)
+    urls = _URL_PATTERN.findall(text)
+
+    return markdown_links + urls
+
+
+# チャット1回あたりに取得するリンク数の上限
+MAX_FETCHED_LINKS = 8
+# 取得したリンクの内容のキャッシュ（URL -> テキスト）。ウォームスタート時に使い回す
+URL_CONTENT_CACHE_SIZE = 256
+_url_content_cache: OrderedDict[str, str] = OrderedDict()
+# 1ページから1000文字の本文を取り出すには十分な量だけ読み込む
+MAX_FETCHED_BYTES = 64 * 1024
+# 同じサイトに負荷をかけすぎないよう、ホストごとに同時取得数を制限する
+MAX_CONCURRENT_FETCHES_PER_HOST = 4
+# ホスト -> (セマフォ, 利用中のリクエスト数)。使われなくなったホストは削除する
+_host_semaphores: dict[str, tuple[asyncio.Semaphore, int]] = {}
+# 遅いサイトがあってもチャット全体が止まらないよう、
+# リンク取得全体にかける時間の上限（秒）
+LINK_FETCH_DEADLINE = 10
+
+
+@asynccontextmanager
+async def _host_slot(host: str):
+    """ホストごとの同時取得数の枠を確保する（アイドルになったホストの枠は破棄する）"""
+    semaphore, users = _host_semaphores.get(
+        host, (asyncio.Semaphore(MAX_CONCURRENT_FETCHES_PER_HOST), 0)
+    )
+    _host_semaphores[host] = (semaphore, users + 1)
+    try:
+        async with semaphore:
+            yield
+    finally:
+        semaphore, users = _host_semaphores[host]
+        if users == 1:
+            del _host_semaphores[host]
+        else:
+            _host_semaphores[host] = (semaphore, users - 1)
+
 
-    return [url for _, url in markdown_links] + urls
+async def fetch_url_content(url: str) -> str | None:
+    """URLの内容を取得してテキストに変換する（取得できた内容はキャッシュする）"""
+    if url in _url_content_cache:
+        _url_content_cache.move_to_end(url)
+        return _url_content_cache[url]
 
+    content = await _fetch_url_content(url)
+    if content is not None:
+        _url_content_cache[url] = content
+        if len(_url_content_cache) > URL_CONTENT_CACHE_SIZE:
+            _url_content_cache.popitem(last=False)
+    return content
 
-def fetch_url_content(url: str) -> str | None:
+
+async def _fetch_url_content(url: str) -> str | None:
     """URLの内容を取得してテキストに変換する"""
     try:
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.text, "html.parser")
+        async with (
+            _host_slot(httpx.URL(url).host),
+            http_client.stream("GET", url) as response,
+        ):
+            response.raise_for_status()
+            # ページ全体は読まず、先頭の MAX_FETCHED_BYTES だけを読み込む
+            body = bytearray()
+            async for chunk in response.aiter_bytes():
+                body.extend(chunk)
+                if len(body) >= MAX_FETCHED_BYTES:
+                    break
+        html = body[:MAX_FETCHED_BYTES].decode(
+            response.encoding or "utf-8", errors="replace"
+        )
+        tree = LexborHTMLParser(html)
 
         # スクリプト、スタイル、ナビゲーション要素を削除
-        for element in soup(["script", "style", "nav", "header", "footer"]):
+        for element in tree.css("script, style, nav, header, footer"):
             element.decompose()
 
         # メインコンテンツを抽出（article, main, または本文要素）
-        main_content = soup.find("article") or soup.find("main") or soup.find("body")
+        main_content = tree.css_first("article") or tree.css_first("main") or tree.body
         if main_content:
             # テキストを抽出し、余分な空白を削除
-            text = " ".join(main_content.get_text(separator=" ").split())
+            text = " ".join(main_content.text(separator=" ").split())
             # 長すぎる場合は最初の1000文字に制限
             return text[:1000] + "..." if len(text) > 1000 else text
 
@@ -151,19 +271,42 @@ def fetch_markdown(app_name: str, date_str: str) -> str | None:
     指定されたアプリ名と日付のS3上のMarkdownファイルを取得して返す。
     ファイルが存在しない場合は None を返す。
     """
+    md_content, _ = fetch_markdown_with_etag(app_name, date_str)
+    return md_content
+
+
+def fetch_markdown_with_etag(
+    app_name: str, date_str: str, if_none_match: str | None = None
+) -> tuple[str | None, str | None]:
+    """
+    指定されたアプリ名と日付のS3上のMarkdownファイルを、そのETagとともに取得して返す。
+    ファイルが存在しない場合は (None, None) を返す。
+    if_none_match がS3上のETagと一致する場合は、
+    本文を取得せずに (None, if_none_match) を返す。
+    """
     key = f"{app_name}/{date_str}.md"
     try:
-        response = s3_client.get_object(Bucket=BUCKET_NAME, Key=key)
+        params = {"Bucket": BUCKET_NAME, "Key": key}
+        if if_none_match:
+            params["IfNoneMatch"] = if_none_match
+        response = s3_client.get_object(**params)
         md_content = response["Body"].read().decode("utf-8")
         print(f"Successfully fetched markdown for {key}")
         # print(md_content[:500]) # Optional debug logging
-        return md_content
+        return md_content, response["ETag"]
     except s3_client.exceptions.NoSuchKey:
         print(f"Markdown file not found for {key}")
-        return None
+        return None, None
+    except ClientError as e:
+        if e.response["Error"]["Code"] == "304":
+            print(f"Markdown not modified for {key}")
+            return None, if_none_match
+        print(f"Error fetching {key}: {e}")
+        return f"Error fetching content: {e}", None
     except Exception as e:
         print(f"Error fetching {key}: {e}")
-        return f"Error fetching content: {e}" # Return error string on other errors
+        # Return error string on other errors
+        return f"Error fetching content: {e}", None
 
 
 @app.get("/", response_class=HTMLResponse)
@@ -171,15 +314,30 @@ async def index(request: Request, date: str = None):
     if date is None:
         date = datetime.date.today().strftime("%Y-%m-%d")
 
+    # 各アプリのMarkdownと天気データを並行して取得
+    weather_data, *markdowns = await asyncio.gather(
+        asyncio.to_thread(get_weather_data),
+        *[asyncio.to_thread(fetch_markdown, name, date) for name in app_names],
+    )
+
     contents = {}
     markdown_exists = {}
-    for name in app_names:
-        content = fetch_markdown(name, date)
+    for name, content in zip(app_names, markdowns, strict=True):
         contents[name] = content if content is not None else ""
         markdown_exists[name] = content is not None and not content.startswith("Error fetching")
 
-    # 天気データを取得
-    weather_data = get_weather_data()
+    # 表示内容が変わっていなければ、ページを描画せずに304を返す
+    etag = '"{}"'.format(
+        hashlib.md5(
+            orjson.dumps(
+                [_INDEX_TEMPLATE_HASH, date, contents, weather_data],
+                option=orjson.OPT_SORT_KEYS,
+            )
+        ).hexdigest()
+    )
+    headers = {"ETag": etag, "Cache-Control": "private, max-age=60"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
 
     return templates.TemplateResponse(
         "index.html",
@@ -191,13 +349,14 @@ async def index(request: Request, date: str = None):
             "weather_data": weather_data,
             "markdown_exists": markdown_exists, # Markdownの存在有無を渡す
         },
+        headers=headers,
     )
 
 
-@app.get("/api/weather", response_class=JSONResponse)
+@app.get("/api/weather")
 async def get_weather():
     """天気データを取得するAPIエンドポイント"""
-    return get_weather_data()
+    return await asyncio.to_thread(get_weather_data)
 
 
 _MESSAGE = """
@@ -228,18 +387,31 @@ _MESSAGE = """
 
 @app.post("/chat/{topic_id}")
 async def chat(topic_id: str, request: Request):
-    data = await request.json()
+    data = orjson.loads(await request.body())
     message = data.get("message")
     markdown = data.get("markdown")
     chat_history = data.get("chat_history", "なし")  # チャット履歴を受け取る
 
     # markdownとメッセージからリンクを抽出
-    links = extract_links(markdown) + extract_links(message)
-
-    # リンクの内容を取得
+    # 重複を除き、取得するリンク数に上限を設ける
+    links = list(dict.fromkeys(extract_links(markdown) + extract_links(message)))
+    links = links[:MAX_FETCHED_LINKS]
+
+    # リンクの内容を並行して取得
+    # 期限内に取得できなかったリンクは諦めて、取得できた分だけを使う
+    tasks = [asyncio.create_task(fetch_url_content(url)) for url in links]
+    if tasks:
+        _, pending = await asyncio.wait(tasks, timeout=LINK_FETCH_DEADLINE)
+        if pending:
+            print(f"Timed out fetching links: cancelling {len(pending)} fetches")
+            for task in pending:
+                task.cancel()
+            # キャンセルを待ち、ホストごとの枠を確実に解放させる
+            await asyncio.wait(pending)
+    link_contents = [None if task.cancelled() else task.result() for task in tasks]
     additional_context = []
-    for url in links:
-        if content := fetch_url_content(url):
+    for url, content in zip(links, link_contents, strict=True):
+        if content:
             additional_context.append(f"- Content from {url}:\n\n'''{content}'''\n\n")
 
     # 追加コンテキストがある場合、markdownに追加
@@ -266,19 +438,26 @@ async def chat(topic_id: str, request: Request):
 
 # Endpoint to fetch markdown content for a specific app and date
 @app.get("/api/markdown/{app_name}")
-async def get_markdown_content(app_name: str, date: str = None):
+async def get_markdown_content(app_name: str, request: Request, date: str = None):
     if date is None:
         date = datetime.date.today().strftime("%Y-%m-%d")
     if app_name not in app_names:
         raise HTTPException(status_code=404, detail="App not found")
 
-    content = fetch_markdown(app_name, date)
-    if content is None:
+    # ブラウザが持っているETagと一致すれば、本文を返さずに304を返す
+    # no-cache でブラウザに毎回ETagでの再検証をさせる
+    content, etag = fetch_markdown_with_etag(
+        app_name, date, request.headers.get("if-none-match")
+    )
+    headers = {"ETag": etag, "Cache-Control": "no-cache"} if etag else None
+    if content is None and etag is not None:
+        return Response(status_code=304, headers=headers)
+    elif content is None:
         raise HTTPException(status_code=404, detail="Markdown content not found")
     elif content.startswith("Error fetching"):
         raise HTTPException(status_code=500, detail=content) # Propagate fetch error
     else:
-        return {"markdown": content}
+        return ORJSONResponse(content={"markdown": content}, headers=headers)
 
 
 # AWS Lambda上でFastAPIを実行するためのハンドラ
@@ -292,7 +471,7 @@ async def retry_job(app_name: str):
 
     function_arn = FUNCTION_ARNS[app_name]
     # Payload for EventBridge-triggered Lambda functions
-    payload = json.dumps({"source": "aws.events"})
+    payload = orjson.dumps({"source": "aws.events"})
 
     try:
         print(f"Attempting to invoke {app_name} ({function_arn}) asynchronously...")
@@ -306,7 +485,7 @@ async def retry_job(app_name: str):
         # Check the status code from the invoke call itself
         if response.get("StatusCode") == 202:
              print(f"Successfully invoked {app_name} asynchronously. Status: 202")
-             return JSONResponse(
+             return ORJSONResponse(
                  status_code=202,
                  content={"message": f"Job trigger for {app_name} accepted. Processing started."}
              )